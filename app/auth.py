@@ -1,13 +1,23 @@
 """OpenID Connect authentication for FastAPI."""
 
+import asyncio
+import base64
+import binascii
+import functools
+import hashlib
+import json
 import logging
+import time
 from typing import Annotated
 
 import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
 from fastapi import Depends, HTTPException, status, Header
-from jose import JWTError, jwt
 from pydantic_settings import BaseSettings
 
+from app.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,6 +26,10 @@ class OIDCSettings(BaseSettings):
     provider_url: str
     audience: str
     issuer: str | None = None
+    cache_ttl: float = 60.0
+    cache_size: int = 10_000
+    jwks_refresh_interval: float = 3600.0
+    jwks_min_refresh_interval: float = 60.0
 
     class Config:
         env_prefix = "OIDC_"
@@ -28,38 +42,139 @@ class OIDCSettings(BaseSettings):
         return self.issuer or self.provider_url.rstrip('/')
 
 
+@functools.lru_cache(maxsize=1)
+def get_settings() -> OIDCSettings:
+    """Return the OIDC settings, read from the environment once."""
+    return OIDCSettings()
+
+
 # Global cache for JWKS
 _jwks_cache: dict | None = None
 
+# Verification keys constructed once per JWKS fetch, keyed by kid
+_jwk_by_kid: dict[str | None, RSAPublicKey] = {}
+
+# Monotonic time of the last JWKS fetch attempt, to rate-limit on-demand refreshes
+_jwks_refreshed_at = float("-inf")
+
+# Shared HTTP client so JWKS refreshes reuse pooled connections
+_http_client: httpx.AsyncClient | None = None
+
+# Verified token claims keyed by SHA-256 of the raw token
+_token_cache: TTLCache | None = None
+
+
+def get_token_cache() -> TTLCache:
+    """Return the verified token cache, creating it on first use."""
+    global _token_cache
+
+    if _token_cache is None:
+        settings = get_settings()
+        _token_cache = TTLCache(maxsize=settings.cache_size, ttl=settings.cache_ttl)
+    return _token_cache
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client used to talk to the OIDC provider."""
+    global _http_client
+
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=300),
+        )
+    return _http_client
 
-async def get_jwks() -> dict:
-    """Fetch and cache JWKS from the OIDC provider."""
-    global _jwks_cache
 
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _build_signing_keys(jwks: dict) -> dict[str | None, RSAPublicKey]:
+    """Construct RS256 verification keys for every signing key in the JWKS."""
+    keys = {}
+    for key_data in jwks.get("keys", []):
+        if key_data.get("kty") != "RSA" or key_data.get("use", "sig") != "sig":
+            continue
+        keys[key_data.get("kid")] = jwt.PyJWK(key_data, algorithm="RS256").key
+    return keys
+
+
+def _decode_header(token: str) -> dict:
+    """Decode only the JOSE header segment of a compact JWT."""
+    header_segment, _, _ = token.partition(".")
+    try:
+        header = json.loads(base64.urlsafe_b64decode(header_segment + "=" * (-len(header_segment) % 4)))
+    except (binascii.Error, ValueError) as e:
+        raise jwt.DecodeError(f"Invalid token header: {e}")
+    if not isinstance(header, dict):
+        raise jwt.DecodeError("Invalid token header")
+    return header
+
+
+def _find_signing_key(kid: str | None) -> RSAPublicKey | None:
+    """Look up the verification key for a token's kid header in the loaded JWKS."""
+    key = _jwk_by_kid.get(kid)
+    if key is None and kid is None and len(_jwk_by_kid) == 1:
+        # Single-key providers may omit the kid from their tokens
+        key = next(iter(_jwk_by_kid.values()))
+    return key
+
+
+async def _get_signing_key(kid: str | None) -> RSAPublicKey:
+    """
+    Look up the verification key for a token's kid header.
+    
+    An unknown kid may mean the provider rotated its keys since the JWKS was
+    fetched, so it is re-fetched once, at most every jwks_min_refresh_interval.
+    """
+    key = _find_signing_key(kid)
+    if key is None and time.monotonic() - _jwks_refreshed_at >= get_settings().jwks_min_refresh_interval:
+        await refresh_jwks()
+        key = _find_signing_key(kid)
+    if key is None:
+        raise jwt.InvalidKeyError(f"Unknown signing key: {kid}")
+    return key
+
+
+async def get_jwks() -> dict:
+    """Return the cached JWKS, fetching it from the OIDC provider on first use."""
     if _jwks_cache is not None:
         return _jwks_cache
+    return await refresh_jwks()
+
+
+async def refresh_jwks() -> dict:
+    """Fetch the JWKS from the OIDC provider and swap it in with its signing keys."""
+    global _jwks_cache, _jwk_by_kid, _jwks_refreshed_at
+
+    # Failed attempts count too, so a provider outage is not hammered
+    _jwks_refreshed_at = time.monotonic()
 
     try:
-        settings = OIDCSettings()
+        settings = get_settings()
         
-        async with httpx.AsyncClient() as client:
-            # Get well-known configuration
-            well_known_resp = await client.get(
-                settings.well_known_url,
-                timeout=10.0
-            )
-            well_known_resp.raise_for_status()
-            well_known = well_known_resp.json()
-            
-            # Get JWKS
-            jwks_uri = well_known.get("jwks_uri")
-            if not jwks_uri:
-                raise ValueError("JWKS URI not found in well-known configuration")
-            
-            jwks_resp = await client.get(jwks_uri, timeout=10.0)
-            jwks_resp.raise_for_status()
-            _jwks_cache = jwks_resp.json()
-            return _jwks_cache
+        client = get_http_client()
+        
+        # Get well-known configuration
+        well_known_resp = await client.get(settings.well_known_url)
+        well_known_resp.raise_for_status()
+        well_known = well_known_resp.json()
+        
+        # Get JWKS
+        jwks_uri = well_known.get("jwks_uri")
+        if not jwks_uri:
+            raise ValueError("JWKS URI not found in well-known configuration")
+        
+        jwks_resp = await client.get(jwks_uri)
+        jwks_resp.raise_for_status()
+        jwks = jwks_resp.json()
+        signing_keys = _build_signing_keys(jwks)
             
     except Exception as e:
         logger.error(f"Failed to fetch JWKS: {e}")
@@ -68,6 +183,40 @@ async def get_jwks() -> dict:
             detail="OIDC provider unavailable"
         )
 
+    # Claims verified against a different key set must not outlive it
+    if jwks != _jwks_cache and _token_cache is not None:
+        _token_cache.clear()
+
+    # Swap both without yielding to the event loop in between
+    _jwk_by_kid = signing_keys
+    _jwks_cache = jwks
+    return jwks
+
+
+async def prefetch_jwks() -> None:
+    """Load the JWKS at startup so the first request does not pay for it."""
+    try:
+        await get_jwks()
+    except HTTPException:
+        logger.warning("JWKS prefetch failed, retrying on first authenticated request")
+
+
+async def refresh_jwks_periodically() -> None:
+    """Re-fetch the JWKS at the configured interval so rotated keys are picked up."""
+    try:
+        interval = get_settings().jwks_refresh_interval
+    except Exception as e:
+        logger.error(f"Periodic JWKS refresh disabled: {e}")
+        return
+    
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_jwks()
+        except HTTPException:
+            # Already logged; keep serving the previous key set
+            continue
+
 
 async def get_current_user(
     authorization: Annotated[str | None, Header()] = None
@@ -87,32 +236,46 @@ async def get_current_user(
             )
         
         # Extract token from Bearer scheme
-        scheme, _, token = authorization.partition(" ")
-        if scheme.lower() != "bearer" or not token:
+        token = authorization[7:]
+        if authorization[:7].lower() != "bearer " or not token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authorization scheme",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        settings = OIDCSettings()
+        # Skip signature verification for tokens seen recently
+        cache_key = hashlib.sha256(token.encode()).digest()
+        token_cache = get_token_cache()
+        cached_payload = token_cache.get(cache_key)
+        if cached_payload is not None:
+            return cached_payload
         
-        # Get JWKS for verification
-        jwks = await get_jwks()
+        settings = get_settings()
+        
+        # Make sure the JWKS (and the keys built from it) are loaded
+        await get_jwks()
+        
+        # Verify against the prebuilt key for the token's kid
+        kid = _decode_header(token).get("kid")
+        key = await _get_signing_key(kid)
         
         # Decode and verify the token
         payload = jwt.decode(
             token,
-            jwks,
+            key=key,
             algorithms=["RS256"],
             audience=settings.audience,
             issuer=settings.get_issuer(),
-            options={"verify_signature": True}
+            options={"require": ["exp"]}
         )
         
+        # Never serve cached claims past the token's own expiry
+        token_cache.set(cache_key, payload, ttl=payload["exp"] - time.time())
+        
         return payload
         
-    except JWTError as e:
+    except jwt.PyJWTError as e:
         logger.warning(f"JWT validation error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
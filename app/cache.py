@@ -0,0 +1,107 @@
+"""In-process caching utilities."""
+
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    Bounded least-recently-used cache whose entries expire after a time-to-live.
+
+    Expiry is tracked on the monotonic clock. All operations take an internal
+    lock, so one instance can be shared between the event loop and threadpool
+    handlers.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Default entry lifetime in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        Store a value, evicting the least recently used entries when full.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Optional lifetime in seconds, capped at the cache default
+        """
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0 or self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, monotonic() + lifetime)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class Generations:
+    """
+    Per-key write counters guarding a read-through cache against stale fills.
+
+    A handler that misses the cache reads the key's generation before querying
+    and stores its result only if the generation is unchanged afterwards.
+    Writers bump the generation (and drop the cache entry) once their change is
+    committed, so a query that raced a write never caches the old value.
+    """
+
+    def __init__(self):
+        self._counts: dict[Hashable, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> tuple[int, int]:
+        """Return an opaque token that changes whenever key (or every key) is bumped."""
+        with self._lock:
+            return self._epoch, self._counts.get(key, 0)
+
+    def bump(self, key: Hashable) -> None:
+        """Record a write to key."""
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def bump_all(self) -> None:
+        """Record a write that affects every key."""
+        with self._lock:
+            self._epoch += 1
+            self._counts.clear()
@@ -1,8 +1,11 @@
 """Database setup and utilities."""
 
+import asyncio
 import duckdb
+import threading
 import uuid
 import os
+from typing import Iterator
 
 # Use /app/data for Docker volume, fallback to current directory for local development
 DB_PATH = os.getenv("DB_PATH", "/app/data/traffic_lights.duckdb")
@@ -10,58 +13,110 @@ DB_PATH = os.getenv("DB_PATH", "/app/data/traffic_lights.duckdb")
 # Create data directory if it doesn't exist
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-# Flag to track if tables have been initialized
-_tables_initialized = False
+# Shared database connection, opened on first use
+_db: duckdb.DuckDBPyConnection | None = None
+_db_lock = threading.Lock()
 
 
 def _initialize_tables(conn):
-    """Initialize database tables (called once per session)"""
-    global _tables_initialized
+    """Create the database tables if they don't exist (called when the connection is opened)"""
+    # Create traffic_lights table if it doesn't exist
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS traffic_lights (
+            id VARCHAR PRIMARY KEY,
+            location VARCHAR NOT NULL,
+            latitude DOUBLE,
+            longitude DOUBLE,
+            notes VARCHAR,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
     
-    if _tables_initialized:
-        return
+    # Create schedules table if it doesn't exist
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedules (
+            id VARCHAR PRIMARY KEY,
+            traffic_light_id VARCHAR NOT NULL,
+            green_start TIMESTAMP NOT NULL,
+            green_end TIMESTAMP NOT NULL,
+            duration_ms INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(traffic_light_id) REFERENCES traffic_lights(id)
+        )
+    """)
+
+
+def _get_database():
+    """Open the shared DuckDB connection and create the tables on first use"""
+    global _db
     
-    try:
-        # Create traffic_lights table if it doesn't exist
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS traffic_lights (
-                id VARCHAR PRIMARY KEY,
-                location VARCHAR NOT NULL,
-                latitude DOUBLE,
-                longitude DOUBLE,
-                notes VARCHAR,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create schedules table if it doesn't exist
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS schedules (
-                id VARCHAR PRIMARY KEY,
-                traffic_light_id VARCHAR NOT NULL,
-                green_start TIMESTAMP NOT NULL,
-                green_end TIMESTAMP NOT NULL,
-                duration_ms INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(traffic_light_id) REFERENCES traffic_lights(id)
-            )
-        """)
-        
-        _tables_initialized = True
-    except Exception as e:
-        # If tables already exist, that's fine
-        if "already exists" not in str(e):
-            _tables_initialized = True
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                conn = duckdb.connect(DB_PATH, read_only=False)
+                _initialize_tables(conn)
+                _db = conn
+    return _db
+
+
+def close_database():
+    """Close the shared DuckDB connection (called on application shutdown)"""
+    global _db
+    
+    with _db_lock:
+        if _db is not None:
+            _db.close()
+            _db = None
 
 
 def get_connection():
-    """Get a DuckDB connection and ensure the tables exist"""
-    conn = duckdb.connect(DB_PATH, read_only=False)
-    _initialize_tables(conn)
-    return conn
+    """Get a cursor on the shared DuckDB connection (cheap to open and close)"""
+    return _get_database().cursor()
+
+
+def get_db_cursor() -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    FastAPI dependency yielding a cursor on the shared connection.
+
+    The cursor is closed once the response has been sent.
+    Use it as: `conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]`
+    """
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+async def fetch_all(conn, query: str, parameters: list | None = None) -> list:
+    """Run a query on a worker thread and return all rows"""
+    return await asyncio.to_thread(lambda: conn.execute(query, parameters).fetchall())
+
+
+async def fetch_one(conn, query: str, parameters: list | None = None) -> tuple | None:
+    """Run a query on a worker thread and return the first row"""
+    return await asyncio.to_thread(lambda: conn.execute(query, parameters).fetchone())
+
+
+async def fetch_all_from(conn, name: str, columns: dict, query: str, parameters: list | None = None) -> list:
+    """
+    Run a query on a worker thread with in-memory columns available as a table.
+    
+    The columns (NumPy arrays keyed by column name) are registered on the cursor
+    under the given name for the duration of the query only. This is much
+    cheaper than binding long Python lists as query parameters.
+    """
+    def run():
+        conn.register(name, columns)
+        try:
+            return conn.execute(query, parameters).fetchall()
+        finally:
+            conn.unregister(name)
+    
+    return await asyncio.to_thread(run)
 
 
 def get_next_id():
-    """Generate a new UUID for a traffic light"""
-    return str(uuid.uuid4())
+    """Generate a new random ID (UUID4 as 32 hex digits, without dashes)"""
+    return uuid.uuid4().hex
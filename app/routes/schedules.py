@@ -2,91 +2,172 @@
 
 from typing import Annotated, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+import numpy as np
+from duckdb import DuckDBPyConnection
+from fastapi import APIRouter, HTTPException, Depends, Query, Body
 from typing import List
-from datetime import datetime
+from datetime import datetime, timezone
 
-from app.models import Schedule, ScheduleCreate, SchedulePattern, DailyTimeline, TimelineEntry
-from app.database import get_connection, get_next_id
+from app.models import Schedule, ScheduleCreate, SchedulePattern, DailyTimeline
+from app.database import get_db_cursor, get_next_id, fetch_all, fetch_all_from, fetch_one
 from app.auth import get_current_user
-from app.services import PatternDetector
+from app.services import PatternDetector, MAX_RED_MS, VALIDATION_TOLERANCE_MS
+from app.cache import Generations, TTLCache
 
 router = APIRouter(
     prefix="/api",
     tags=["Schedules"]
 )
 
+# Column order of schedule rows as selected below
+_SCHEDULE_FIELDS = ("id", "traffic_light_id", "green_start", "green_end", "duration_ms", "created_at")
+
+# Schedules of the traffic light bound to $1 in chronological order, with the
+# cycle time and red gap to the previous green light and the time of day, all
+# in exact microseconds (see PatternDetector._compute_base_cycle and
+# validate_pattern, which this mirrors)
+_SCHEDULE_GAPS = """
+    s AS (
+        SELECT green_start, green_end, duration_ms,
+               ROW_NUMBER() OVER w AS seq,
+               epoch_us(green_start) - epoch_us(LAG(green_start) OVER w) AS cycle_us,
+               epoch_us(green_start) - epoch_us(LAG(green_start) OVER w)
+                   - CAST(LAG(duration_ms) OVER w AS BIGINT) * 1000 AS red_us,
+               epoch_us(green_start) - epoch_us(date_trunc('day', green_start)) AS time_of_day_us
+        FROM schedules
+        WHERE traffic_light_id = $1
+        WINDOW w AS (ORDER BY green_start, duration_ms)
+    )
+"""
+
+# Aggregated schedule rows for the pattern endpoints, keyed by ("pattern", id)
+# or ("timeline", id). Only the time-independent SQL results are kept;
+# predictions relative to now are rebuilt on every request.
+# Entries are dropped whenever a schedule of the traffic light is written, and
+# a query that raced such a write is not cached (see Generations).
+_aggregate_cache = TTLCache(maxsize=1024, ttl=60.0)
+_aggregate_generations = Generations()
+
+# Largest number of schedules accepted by the batch endpoint in one request
+MAX_BATCH_SIZE = 10000
+
+
+def _invalidate_aggregates(traffic_light_id: str) -> None:
+    """Drop the cached aggregates of a traffic light after its schedules change"""
+    _aggregate_generations.bump(traffic_light_id)
+    _aggregate_cache.pop(("pattern", traffic_light_id))
+    _aggregate_cache.pop(("timeline", traffic_light_id))
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO timestamp into a naive UTC datetime, as stored in TIMESTAMP columns"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 
 @router.get("/traffic-lights/{traffic_light_id}/schedules", response_model=List[Schedule])
-def get_schedules(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)]):
+async def get_schedules(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Get all schedules for a traffic light"""
     try:
-        conn = get_connection()
-        result = conn.execute(
-            "SELECT * FROM schedules WHERE traffic_light_id = ? ORDER BY created_at DESC",
+        # Timestamps are rendered as text by DuckDB rather than per row in Python
+        result = await fetch_all(
+            conn,
+            """
+            SELECT id, traffic_light_id, CAST(green_start AS VARCHAR), CAST(green_end AS VARCHAR),
+                   duration_ms, CAST(created_at AS VARCHAR)
+            FROM schedules WHERE traffic_light_id = ? ORDER BY created_at DESC
+            """,
             [traffic_light_id]
-        ).fetchall()
-        conn.close()
-        
-        schedules = []
-        for row in result:
-            schedules.append(Schedule(
-                id=row[0],
-                traffic_light_id=row[1],
-                green_start=str(row[2]),
-                green_end=str(row[3]),
-                duration_ms=row[4],
-                created_at=str(row[5])
-            ))
-        
-        return schedules
+        )
+        
+        # Plain dicts are validated and serialized to JSON in one pass by
+        # FastAPI's response_model handling, without building Schedule objects
+        return [dict(zip(_SCHEDULE_FIELDS, row)) for row in result]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/traffic-lights/{traffic_light_id}/schedules", response_model=Schedule)
-def create_schedule(traffic_light_id: str, schedule: ScheduleCreate, _: Annotated[dict, Depends(get_current_user)]):
+async def create_schedule(traffic_light_id: str, schedule: ScheduleCreate, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Create a new schedule for a traffic light"""
     try:
-        # Verify traffic light exists
-        conn = get_connection()
-        existing = conn.execute(
-            "SELECT * FROM traffic_lights WHERE id = ?",
-            [traffic_light_id]
-        ).fetchall()
-        
-        if not existing:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Traffic light not found")
-        
         # Parse timestamps and calculate duration
-        green_start = datetime.fromisoformat(schedule.green_start.replace('Z', '+00:00'))
-        green_end = datetime.fromisoformat(schedule.green_end.replace('Z', '+00:00'))
+        green_start = _parse_timestamp(schedule.green_start)
+        green_end = _parse_timestamp(schedule.green_end)
         duration_ms = int((green_end - green_start).total_seconds() * 1000)
         
         new_id = get_next_id()
         
-        result = conn.execute(
+        # Insert only if the traffic light exists, in a single statement
+        result = await fetch_all(
+            conn,
             """
             INSERT INTO schedules (id, traffic_light_id, green_start, green_end, duration_ms)
-            VALUES (?, ?, ?, ?, ?)
-            RETURNING *
+            SELECT ?, id, ?, ?, ? FROM traffic_lights WHERE id = ?
+            RETURNING id, traffic_light_id, CAST(green_start AS VARCHAR), CAST(green_end AS VARCHAR),
+                      duration_ms, CAST(created_at AS VARCHAR)
             """,
-            [new_id, traffic_light_id, schedule.green_start, schedule.green_end, duration_ms]
-        ).fetchall()
-        
-        conn.close()
-        
-        if result:
-            row = result[0]
-            return Schedule(
-                id=row[0],
-                traffic_light_id=row[1],
-                green_start=str(row[2]),
-                green_end=str(row[3]),
-                duration_ms=row[4],
-                created_at=str(row[5])
-            )
+            [new_id, green_start, green_end, duration_ms, traffic_light_id]
+        )
+        
+        if not result:
+            raise HTTPException(status_code=404, detail="Traffic light not found")
+        
+        _invalidate_aggregates(traffic_light_id)
+        return dict(zip(_SCHEDULE_FIELDS, result[0]))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/traffic-lights/{traffic_light_id}/schedules/batch", response_model=List[Schedule])
+async def create_schedules(traffic_light_id: str, schedules: Annotated[List[ScheduleCreate], Body(max_length=MAX_BATCH_SIZE)], _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
+    """Create several schedules for a traffic light at once (e.g. a capture session)"""
+    try:
+        if not schedules:
+            # Nothing to insert, but an unknown traffic light is still an error
+            existing = await fetch_one(conn, "SELECT 1 FROM traffic_lights WHERE id = ?", [traffic_light_id])
+            if existing is None:
+                raise HTTPException(status_code=404, detail="Traffic light not found")
+            return []
+        
+        # Parse timestamps and calculate durations
+        green_starts = [_parse_timestamp(schedule.green_start) for schedule in schedules]
+        green_ends = [_parse_timestamp(schedule.green_end) for schedule in schedules]
+        batch = {
+            "id": np.array([get_next_id() for _ in schedules]),
+            "green_start": np.array(green_starts, dtype="datetime64[us]"),
+            "green_end": np.array(green_ends, dtype="datetime64[us]"),
+            "duration_ms": np.array([
+                int((green_end - green_start).total_seconds() * 1000)
+                for green_start, green_end in zip(green_starts, green_ends)
+            ], dtype=np.int64)
+        }
+        
+        # Insert the whole batch in a single statement, only if the traffic light exists
+        result = await fetch_all_from(
+            conn,
+            "schedule_batch",
+            batch,
+            """
+            INSERT INTO schedules (id, traffic_light_id, green_start, green_end, duration_ms)
+            SELECT b.id, t.id, b.green_start, b.green_end, b.duration_ms
+            FROM schedule_batch b, traffic_lights t
+            WHERE t.id = ?
+            RETURNING id, traffic_light_id, CAST(green_start AS VARCHAR), CAST(green_end AS VARCHAR),
+                      duration_ms, CAST(created_at AS VARCHAR)
+            """,
+            [traffic_light_id]
+        )
+        
+        if not result:
+            raise HTTPException(status_code=404, detail="Traffic light not found")
+        
+        _invalidate_aggregates(traffic_light_id)
+        return [dict(zip(_SCHEDULE_FIELDS, row)) for row in result]
     except HTTPException:
         raise
     except Exception as e:
@@ -94,23 +175,19 @@ def create_schedule(traffic_light_id: str, schedule: ScheduleCreate, _: Annotate
 
 
 @router.delete("/schedules/{schedule_id}")
-def delete_schedule(schedule_id: str, _: Annotated[dict, Depends(get_current_user)]):
+async def delete_schedule(schedule_id: str, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Delete a schedule"""
     try:
-        conn = get_connection()
-        
-        existing = conn.execute(
-            "SELECT * FROM schedules WHERE id = ?",
+        deleted = await fetch_all(
+            conn,
+            "DELETE FROM schedules WHERE id = ? RETURNING traffic_light_id",
             [schedule_id]
-        ).fetchall()
+        )
         
-        if not existing:
-            conn.close()
+        if not deleted:
             raise HTTPException(status_code=404, detail="Schedule not found")
         
-        conn.execute("DELETE FROM schedules WHERE id = ?", [schedule_id])
-        conn.close()
-        
+        _invalidate_aggregates(deleted[0][0])
         return {"message": f"Schedule {schedule_id} deleted successfully"}
     except HTTPException:
         raise
@@ -119,47 +196,61 @@ def delete_schedule(schedule_id: str, _: Annotated[dict, Depends(get_current_use
 
 
 @router.get("/traffic-lights/{traffic_light_id}/pattern", response_model=SchedulePattern)
-def get_schedule_pattern(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)]):
+async def get_schedule_pattern(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Analyze captured schedules and determine traffic light pattern with daily pattern detection"""
     try:
-        conn = get_connection()
-        
         # Verify traffic light exists
-        existing = conn.execute(
-            "SELECT * FROM traffic_lights WHERE id = ?",
+        existing = await fetch_one(
+            conn,
+            "SELECT 1 FROM traffic_lights WHERE id = ?",
             [traffic_light_id]
-        ).fetchall()
+        )
         
-        if not existing:
-            conn.close()
+        if existing is None:
             raise HTTPException(status_code=404, detail="Traffic light not found")
         
-        # Get all schedules for this traffic light, ordered by green_start (oldest first)
-        result = conn.execute(
-            "SELECT duration_ms, green_start, green_end FROM schedules WHERE traffic_light_id = ? ORDER BY green_start ASC",
-            [traffic_light_id]
-        ).fetchall()
+        # Aggregate statistics and the base cycle (the smallest red gap between
+        # consecutive green lights, below two hours) in a single pass
+        row = _aggregate_cache.get(("pattern", traffic_light_id))
+        if row is None:
+            generation = _aggregate_generations.get(traffic_light_id)
+            row = await fetch_one(
+                conn,
+                f"""
+                WITH {_SCHEDULE_GAPS}
+                SELECT COUNT(*), AVG(duration_ms), MIN(duration_ms), MAX(duration_ms),
+                       STDDEV_SAMP(duration_ms),
+                       ARG_MIN(cycle_us, (red_us, seq)) FILTER (WHERE red_us > 0 AND red_us < $2) // 1000,
+                       MIN(red_us) FILTER (WHERE red_us > 0 AND red_us < $2) // 1000,
+                       MAX(green_start), ARG_MAX(green_end, (green_start, duration_ms))
+                FROM s
+                """,
+                [traffic_light_id, MAX_RED_MS * 1000]
+            )
+            if _aggregate_generations.get(traffic_light_id) == generation:
+                _aggregate_cache.set(("pattern", traffic_light_id), row)
         
-        conn.close()
+        total_captures, mean_duration, min_duration, max_duration, std_dev, \
+            base_cycle_ms, red_duration_ms, last_green_start, last_green_end = row
         
-        if not result:
+        if not total_captures:
             return SchedulePattern(
                 has_pattern=False,
                 total_captures=0
             )
         
-        # Extract data
-        durations = [row[0] for row in result]
-        green_starts = [datetime.fromisoformat(str(row[1]).replace('Z', '+00:00')) for row in result]
-        green_ends = [datetime.fromisoformat(str(row[2]).replace('Z', '+00:00')) for row in result]
-        
-        # Use PatternDetector service to analyze patterns
-        detector = PatternDetector(green_starts, durations)
-        pattern_data = detector.analyze()
-        
-        # Add last_capture to the result
-        last_capture = str(green_ends[-1]) if green_ends else None
-        pattern_data["last_capture"] = last_capture
+        # Use PatternDetector service to turn the aggregates into a pattern
+        pattern_data = PatternDetector.build_pattern(
+            total_captures=total_captures,
+            mean_duration=mean_duration,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            std_dev=std_dev if total_captures >= 3 else None,
+            base_cycle_ms=base_cycle_ms,
+            red_duration_ms=red_duration_ms,
+            last_green_start=last_green_start
+        )
+        pattern_data["last_capture"] = str(last_green_end)
         
         return SchedulePattern(**pattern_data)
     except HTTPException:
@@ -169,50 +260,58 @@ def get_schedule_pattern(traffic_light_id: str, _: Annotated[dict, Depends(get_c
 
 
 @router.get("/traffic-lights/{traffic_light_id}/pattern/timeline", response_model=DailyTimeline)
-def get_pattern_timeline(
+async def get_pattern_timeline(
     traffic_light_id: str, 
     _: Annotated[dict, Depends(get_current_user)],
+    conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)],
     date: Optional[str] = Query(None, description="Date for timeline (YYYY-MM-DD), defaults to today"),
     hours: Optional[int] = Query(None, description="Number of hours to generate timeline for (defaults to 24 for full day)")
 ):
     """Get predicted pattern timeline for a specified time period"""
     try:
-        conn = get_connection()
-        
         # Verify traffic light exists
-        existing = conn.execute(
-            "SELECT * FROM traffic_lights WHERE id = ?",
+        existing = await fetch_one(
+            conn,
+            "SELECT 1 FROM traffic_lights WHERE id = ?",
             [traffic_light_id]
-        ).fetchall()
+        )
         
-        if not existing:
-            conn.close()
+        if existing is None:
             raise HTTPException(status_code=404, detail="Traffic light not found")
         
-        # Get all schedules for this traffic light
-        result = conn.execute(
-            "SELECT duration_ms, green_start FROM schedules WHERE traffic_light_id = ? ORDER BY green_start ASC",
-            [traffic_light_id]
-        ).fetchall()
-        
-        conn.close()
-        
-        if not result or len(result) < 2:
-            # Parse date
-            if date:
-                reference_date = datetime.fromisoformat(date).date()
-            else:
-                reference_date = datetime.now().date()
-            
-            return DailyTimeline(
-                date=reference_date.isoformat(),
-                has_pattern=False,
-                entries=[]
+        # Base cycle (as for the pattern), mean duration, the first measurement
+        # as reference and the number of measurements aligned with the cycle
+        # by time of day (within the validation tolerance), in one pass over the schedules
+        row = _aggregate_cache.get(("timeline", traffic_light_id))
+        if row is None:
+            generation = _aggregate_generations.get(traffic_light_id)
+            row = await fetch_one(
+                conn,
+                f"""
+                WITH {_SCHEDULE_GAPS},
+                p AS (
+                    SELECT COUNT(*) AS total, AVG(duration_ms) AS mean_duration,
+                           ARG_MIN(cycle_us, (red_us, seq)) FILTER (WHERE red_us > 0 AND red_us < $2) // 1000 AS base_cycle_ms,
+                           ARG_MIN(green_start, seq) AS reference,
+                           ARG_MIN(time_of_day_us, seq) AS reference_time_us
+                    FROM s
+                ),
+                r AS (
+                    SELECT ((s.time_of_day_us - p.reference_time_us) % (p.base_cycle_ms * 1000)
+                            + p.base_cycle_ms * 1000) % (p.base_cycle_ms * 1000) AS remainder_us
+                    FROM s, p
+                )
+                SELECT total, mean_duration, base_cycle_ms, reference,
+                       (SELECT COUNT(*) FROM r, p
+                        WHERE remainder_us <= $3 OR remainder_us >= p.base_cycle_ms * 1000 - $3)
+                FROM p
+                """,
+                [traffic_light_id, MAX_RED_MS * 1000, VALIDATION_TOLERANCE_MS * 1000]
             )
+            if _aggregate_generations.get(traffic_light_id) == generation:
+                _aggregate_cache.set(("timeline", traffic_light_id), row)
         
-        # Extract data
-        durations = [row[0] for row in result]
-        green_starts = [datetime.fromisoformat(str(row[1]).replace('Z', '+00:00')) for row in result]
+        total_captures, mean_duration, base_cycle_ms, reference, matches = row
         
         # Parse requested date
         if date:
@@ -220,18 +319,26 @@ def get_pattern_timeline(
         else:
             reference_date = datetime.now().date()
         
-        # Use PatternDetector to generate timeline
-        detector = PatternDetector(green_starts, durations)
-        timeline_data = detector.get_daily_timeline(reference_date=reference_date, hours=hours)
-        validation = detector.validate_pattern()
+        if total_captures < 2:
+            return DailyTimeline(
+                date=reference_date.isoformat(),
+                has_pattern=False,
+                entries=[]
+            )
         
-        # Convert to response model
-        entries = [TimelineEntry(**entry) for entry in timeline_data]
+        # Use PatternDetector to generate timeline
+        timeline_data = []
+        if base_cycle_ms:
+            timeline_data = PatternDetector.build_timeline(
+                reference, base_cycle_ms, int(mean_duration), reference_date=reference_date, hours=hours
+            )
+        validation = PatternDetector.build_validation(matches if base_cycle_ms else 0, total_captures)
         
+        # Convert to response model (the entry dicts are validated in one pass)
         return DailyTimeline(
             date=reference_date.isoformat(),
-            has_pattern=len(entries) > 0,
-            entries=entries,
+            has_pattern=len(timeline_data) > 0,
+            entries=timeline_data,
             validation=validation
         )
     except HTTPException:
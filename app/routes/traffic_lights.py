@@ -1,43 +1,102 @@
 """Traffic light endpoints."""
 
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from duckdb import DuckDBPyConnection
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
 from typing import List
 
 from app.models import TrafficLight, TrafficLightCreate, TrafficLightUpdate
-from app.database import get_connection, get_next_id
+from app.database import get_db_cursor, get_next_id, fetch_all, fetch_one
 from app.auth import get_current_user
+from app.cache import Generations, TTLCache
 
 router = APIRouter(
     prefix="/api/traffic-lights",
     tags=["Traffic Lights"]
 )
 
+# Built responses for the read endpoints, keyed by ("list", etag, limit, offset)
+# or ("light", id).
+# List entries are versioned by their ETag; light entries are dropped on writes,
+# and a read that raced such a write is not cached (see Generations).
+_response_cache = TTLCache(maxsize=1024, ttl=30.0)
+_light_generations = Generations()
+
+# Columns read into TrafficLight, in the order the handlers index them.
+# Timestamps are rendered as text by DuckDB rather than per row in Python.
+_COLUMNS = (
+    "id, location, latitude, longitude, notes, "
+    "CAST(last_updated AS VARCHAR), CAST(created_at AS VARCHAR)"
+)
+
+
+def _to_traffic_light(row: tuple) -> TrafficLight:
+    """Build a TrafficLight from a row selected with _COLUMNS, skipping validation of trusted data"""
+    return TrafficLight.model_construct(
+        id=row[0],
+        location=row[1],
+        latitude=row[2],
+        longitude=row[3],
+        notes=row[4],
+        last_updated=row[5],
+        created_at=row[6]
+    )
+
+
+def _invalidate_light(traffic_light_id: str) -> None:
+    """Drop the cached response of a traffic light after it is updated or deleted"""
+    _light_generations.bump(traffic_light_id)
+    _response_cache.pop(("light", traffic_light_id))
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header (possibly a list or weak tags) against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
 
 @router.get("", response_model=List[TrafficLight])
-def get_traffic_lights(_: Annotated[dict, Depends(get_current_user)]):
-    """Get all traffic lights"""
+async def get_traffic_lights(
+    response: Response,
+    _: Annotated[dict, Depends(get_current_user)],
+    conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of traffic lights to return (defaults to all)"),
+    offset: int = Query(0, ge=0, description="Number of traffic lights to skip, newest first")
+):
+    """Get all traffic lights, newest first"""
     try:
-        conn = get_connection()
-        result = conn.execute(
-            "SELECT * FROM traffic_lights ORDER BY created_at DESC"
-        ).fetchall()
-        
-        conn.close()
-        
-        traffic_lights = []
-        for row in result:
-            traffic_lights.append(TrafficLight(
-                id=row[0],
-                location=row[1],
-                latitude=row[2],
-                longitude=row[3],
-                notes=row[4],
-                last_updated=str(row[5]),
-                created_at=str(row[6])
-            ))
+        # Every write bumps last_updated or the row count, so together they
+        # version the list without reading or serializing it
+        count, last_updated = await fetch_one(
+            conn,
+            "SELECT COUNT(*), epoch_us(MAX(last_updated)) FROM traffic_lights"
+        )
+        etag = f'"{count}-{last_updated or 0}"'
         
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        
+        response.headers["ETag"] = etag
+        
+        cache_key = ("list", etag, limit, offset)
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # DuckDB keeps only the top limit + offset rows while sorting
+        result = await fetch_all(
+            conn,
+            f"SELECT {_COLUMNS} FROM traffic_lights ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            [limit, offset]
+        )
+        
+        traffic_lights = [_to_traffic_light(row) for row in result]
+        
+        _response_cache.set(cache_key, traffic_lights)
         return traffic_lights
     except HTTPException:
         raise
@@ -46,35 +105,25 @@ def get_traffic_lights(_: Annotated[dict, Depends(get_current_user)]):
 
 
 @router.post("", response_model=TrafficLight)
-def create_traffic_light(traffic_light: TrafficLightCreate, _: Annotated[dict, Depends(get_current_user)]):
+async def create_traffic_light(traffic_light: TrafficLightCreate, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Create a new traffic light"""
     try:
-        conn = get_connection()
         new_id = get_next_id()
         
-        result = conn.execute(
-            """
+        result = await fetch_all(
+            conn,
+            f"""
             INSERT INTO traffic_lights (id, location, latitude, longitude, notes)
             VALUES (?, ?, ?, ?, ?)
-            RETURNING *
+            RETURNING {_COLUMNS}
             """,
             [new_id, traffic_light.location, traffic_light.latitude, 
              traffic_light.longitude, traffic_light.notes]
-        ).fetchall()
-        
-        conn.close()
+        )
         
         if result:
             row = result[0]
-            return TrafficLight(
-                id=row[0],
-                location=row[1],
-                latitude=row[2],
-                longitude=row[3],
-                notes=row[4],
-                last_updated=str(row[5]),
-                created_at=str(row[6])
-            )
+            return _to_traffic_light(row)
     except HTTPException:
         raise
     except Exception as e:
@@ -82,31 +131,29 @@ def create_traffic_light(traffic_light: TrafficLightCreate, _: Annotated[dict, D
 
 
 @router.get("/{traffic_light_id}", response_model=TrafficLight)
-def get_traffic_light(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)]):
+async def get_traffic_light(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Get a specific traffic light by ID"""
     try:
-        conn = get_connection()
-        
-        result = conn.execute(
-            "SELECT * FROM traffic_lights WHERE id = ?",
+        cached = _response_cache.get(("light", traffic_light_id))
+        if cached is not None:
+            return cached
+        
+        generation = _light_generations.get(traffic_light_id)
+        result = await fetch_all(
+            conn,
+            f"SELECT {_COLUMNS} FROM traffic_lights WHERE id = ?",
             [traffic_light_id]
-        ).fetchall()
-        
-        conn.close()
+        )
         
         if not result:
             raise HTTPException(status_code=404, detail="Traffic light not found")
         
         row = result[0]
-        return TrafficLight(
-            id=row[0],
-            location=row[1],
-            latitude=row[2],
-            longitude=row[3],
-            notes=row[4],
-            last_updated=str(row[5]),
-            created_at=str(row[6])
-        )
+        traffic_light = _to_traffic_light(row)
+        
+        if _light_generations.get(traffic_light_id) == generation:
+            _response_cache.set(("light", traffic_light_id), traffic_light)
+        return traffic_light
     except HTTPException:
         raise
     except Exception as e:
@@ -114,21 +161,9 @@ def get_traffic_light(traffic_light_id: str, _: Annotated[dict, Depends(get_curr
 
 
 @router.put("/{traffic_light_id}", response_model=TrafficLight)
-def update_traffic_light(traffic_light_id: str, traffic_light: TrafficLightUpdate, _: Annotated[dict, Depends(get_current_user)]):
+async def update_traffic_light(traffic_light_id: str, traffic_light: TrafficLightUpdate, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Update a traffic light"""
     try:
-        conn = get_connection()
-        
-        # Check if traffic light exists
-        existing = conn.execute(
-            "SELECT * FROM traffic_lights WHERE id = ?",
-            [traffic_light_id]
-        ).fetchall()
-        
-        if not existing:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Traffic light not found")
-        
         # Build update query dynamically
         update_fields = []
         values = []
@@ -153,26 +188,22 @@ def update_traffic_light(traffic_light_id: str, traffic_light: TrafficLightUpdat
             update_fields.append("last_updated = CURRENT_TIMESTAMP")
             values.append(traffic_light_id)
             
-            query = f"UPDATE traffic_lights SET {', '.join(update_fields)} WHERE id = ? RETURNING *"
-            result = conn.execute(query, values).fetchall()
+            query = f"UPDATE traffic_lights SET {', '.join(update_fields)} WHERE id = ? RETURNING {_COLUMNS}"
+            result = await fetch_all(conn, query, values)
+            _invalidate_light(traffic_light_id)
         else:
-            result = conn.execute(
-                "SELECT * FROM traffic_lights WHERE id = ?",
+            result = await fetch_all(
+                conn,
+                f"SELECT {_COLUMNS} FROM traffic_lights WHERE id = ?",
                 [traffic_light_id]
-            ).fetchall()
+            )
         
-        conn.close()
+        # No row updated (or selected) means the traffic light does not exist
+        if not result:
+            raise HTTPException(status_code=404, detail="Traffic light not found")
         
         row = result[0]
-        return TrafficLight(
-            id=row[0],
-            location=row[1],
-            latitude=row[2],
-            longitude=row[3],
-            notes=row[4],
-            last_updated=str(row[5]),
-            created_at=str(row[6])
-        )
+        return _to_traffic_light(row)
     except HTTPException:
         raise
     except Exception as e:
@@ -180,24 +211,19 @@ def update_traffic_light(traffic_light_id: str, traffic_light: TrafficLightUpdat
 
 
 @router.delete("/{traffic_light_id}")
-def delete_traffic_light(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)]):
+async def delete_traffic_light(traffic_light_id: str, _: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Delete a traffic light"""
     try:
-        conn = get_connection()
-        
-        # Check if traffic light exists
-        existing = conn.execute(
-            "SELECT * FROM traffic_lights WHERE id = ?",
+        deleted = await fetch_all(
+            conn,
+            "DELETE FROM traffic_lights WHERE id = ? RETURNING id",
             [traffic_light_id]
-        ).fetchall()
+        )
+        _invalidate_light(traffic_light_id)
         
-        if not existing:
-            conn.close()
+        if not deleted:
             raise HTTPException(status_code=404, detail="Traffic light not found")
         
-        conn.execute("DELETE FROM traffic_lights WHERE id = ?", [traffic_light_id])
-        conn.close()
-        
         return {"message": f"Traffic light {traffic_light_id} deleted successfully"}
     except HTTPException:
         raise
@@ -206,12 +232,12 @@ def delete_traffic_light(traffic_light_id: str, _: Annotated[dict, Depends(get_c
 
 
 @router.delete("")
-def delete_all_traffic_lights(_: Annotated[dict, Depends(get_current_user)]):
+async def delete_all_traffic_lights(_: Annotated[dict, Depends(get_current_user)], conn: Annotated[DuckDBPyConnection, Depends(get_db_cursor)]):
     """Delete all traffic lights"""
     try:
-        conn = get_connection()
-        conn.execute("DELETE FROM traffic_lights")
-        conn.close()
+        await fetch_all(conn, "TRUNCATE traffic_lights")
+        _light_generations.bump_all()
+        _response_cache.clear()
         return {"message": "All traffic lights deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,5 @@
 """Services package for business logic."""
 
-from app.services.pattern_detector import PatternDetector
+from app.services.pattern_detector import PatternDetector, MAX_RED_MS, VALIDATION_TOLERANCE_MS
 
-__all__ = ["PatternDetector"]
+__all__ = ["PatternDetector", "MAX_RED_MS", "VALIDATION_TOLERANCE_MS"]
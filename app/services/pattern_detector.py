@@ -2,7 +2,27 @@
 
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime, timedelta, time
-from statistics import mean, stdev
+
+import numpy as np
+
+# Regularity labels indexed by how many variance thresholds are exceeded
+REGULARITY_LABELS = ("regular", "somewhat_regular", "irregular")
+
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_DAY_US = 24 * 60 * 60 * 1_000_000
+
+# Red gaps this long or longer are assumed to span different days
+MAX_RED_MS = 2 * 60 * 60 * 1000
+
+# Default distance from a projected green start within which a measurement matches
+VALIDATION_TOLERANCE_MS = 5000
+
+
+def _isoformat(origin: datetime, offsets_us: np.ndarray) -> List[str]:
+    """Format naive timestamps given as microsecond offsets like datetime.isoformat()."""
+    stamps = np.datetime64(origin, "us") + offsets_us.astype("timedelta64[us]")
+    # isoformat() leaves out the fraction when it is zero
+    return np.strings.replace(np.datetime_as_string(stamps, unit="us"), ".000000", "").tolist()
 
 
 class PatternDetector:
@@ -27,6 +47,9 @@ class PatternDetector:
         self.timestamps = timestamps
         self.durations = durations
         self.total_captures = len(timestamps)
+        self._durations = np.asarray(durations, dtype=np.float64)
+        self._base_cycle: Optional[Tuple[Optional[int], Optional[int]]] = None
+        self._start_offsets: Optional[np.ndarray] = None
         
     def analyze(self) -> Dict:
         """
@@ -42,24 +65,59 @@ class PatternDetector:
             }
         
         # Calculate basic statistics
-        avg_duration = int(mean(self.durations))
-        min_duration = min(self.durations)
-        max_duration = max(self.durations)
+        min_duration = int(self._durations.min())
+        max_duration = int(self._durations.max())
         
         # Calculate standard deviation
         std_dev = None
         if self.total_captures >= 3:
-            std_dev = stdev(self.durations)
+            std_dev = float(self._durations.std(ddof=1))
         
         # Find the base pattern (smallest red gap)
         base_cycle_ms, red_duration_ms = self._find_base_cycle()
         
+        return self.build_pattern(
+            total_captures=self.total_captures,
+            mean_duration=float(self._durations.mean()),
+            min_duration=min_duration,
+            max_duration=max_duration,
+            std_dev=std_dev,
+            base_cycle_ms=base_cycle_ms,
+            red_duration_ms=red_duration_ms,
+            last_green_start=max(self.timestamps)
+        )
+    
+    @classmethod
+    def build_pattern(cls, total_captures: int, mean_duration: float, min_duration: int,
+                      max_duration: int, std_dev: Optional[float], base_cycle_ms: Optional[int],
+                      red_duration_ms: Optional[int], last_green_start: datetime) -> Dict:
+        """
+        Assemble pattern information from precomputed statistics.
+        
+        Used by analyze() and by callers that aggregate the measurements
+        elsewhere (e.g. in SQL) instead of loading every row.
+        
+        Args:
+            total_captures: Number of measurements
+            mean_duration: Mean green light duration in milliseconds
+            min_duration: Shortest green light duration in milliseconds
+            max_duration: Longest green light duration in milliseconds
+            std_dev: Sample standard deviation of durations (None if fewer than 3 measurements)
+            base_cycle_ms: Base cycle time from the smallest red gap, or None
+            red_duration_ms: Red duration of the base cycle, or None
+            last_green_start: Start of the most recent green light
+            
+        Returns:
+            Dictionary containing pattern statistics and predictions
+        """
+        avg_duration = int(mean_duration)
+        
         # Determine regularity
-        schedule_regularity = self._determine_regularity()
+        schedule_regularity = cls._determine_regularity(std_dev, mean_duration)
         
         # Predict next green phase
-        next_green_start, next_green_end = self._predict_next_green_phase(
-            base_cycle_ms, avg_duration
+        next_green_start, next_green_end = cls._predict_next_green_phase(
+            last_green_start, base_cycle_ms, avg_duration
         )
         
         return {
@@ -70,7 +128,7 @@ class PatternDetector:
             "stddev_duration_ms": std_dev,
             "typical_duration_ms": avg_duration,
             "schedule_regularity": schedule_regularity,
-            "total_captures": self.total_captures,
+            "total_captures": total_captures,
             "average_cycle_ms": base_cycle_ms,
             "red_duration_ms": red_duration_ms,
             "next_green_start": next_green_start,
@@ -82,97 +140,111 @@ class PatternDetector:
         Find the base cycle by looking for the smallest red gap between green lights.
         
         The assumption is that the smallest red gap represents the basic pattern
-        (green -> red -> green), which repeats throughout the day.
+        (green -> red -> green), which repeats throughout the day. The result is
+        computed once and shared by analyze(), get_daily_timeline() and
+        validate_pattern().
         
         Returns:
             Tuple of (cycle_time_ms, red_duration_ms) or (None, None) if not enough data
         """
+        if self._base_cycle is None:
+            self._base_cycle = self._compute_base_cycle()
+        return self._base_cycle
+    
+    def _compute_base_cycle(self) -> Tuple[Optional[int], Optional[int]]:
+        """Scan consecutive measurements for the smallest red gap (see _find_base_cycle)."""
         if len(self.timestamps) < 2:
             return None, None
         
-        # Sort by timestamp to ensure chronological order
-        sorted_data = sorted(zip(self.timestamps, self.durations))
-        
-        # Calculate red gaps between consecutive green lights
-        red_gaps = []
-        for i in range(len(sorted_data) - 1):
-            green_start_1, green_duration_1 = sorted_data[i]
-            green_start_2, green_duration_2 = sorted_data[i + 1]
-            
-            # Calculate when first green light ends
-            green_end_1 = green_start_1 + timedelta(milliseconds=green_duration_1)
-            
-            # Calculate red duration (gap between green lights)
-            red_duration = (green_start_2 - green_end_1).total_seconds() * 1000
-            
-            # Only consider positive red durations (ignore overlapping or same-day multiples)
-            # Also filter out very large gaps (> 2 hours) as they're likely different days
-            if 0 < red_duration < 2 * 60 * 60 * 1000:
-                cycle_time = (green_start_2 - green_start_1).total_seconds() * 1000
-                red_gaps.append({
-                    'red_duration': red_duration,
-                    'cycle_time': cycle_time,
-                    'green_duration': green_duration_1
-                })
-        
-        if not red_gaps:
+        # Work on integer microsecond offsets so the gaps are exact
+        starts_us = self._start_offsets_us()
+        durations_us = np.round(self._durations * 1000).astype(np.int64)
+        
+        # Sort by timestamp (then duration) to ensure chronological order,
+        # unless the caller already passed them that way (as the database does)
+        start_steps = np.diff(starts_us)
+        if not np.all((start_steps > 0) | ((start_steps == 0) & (np.diff(self._durations) >= 0))):
+            order = np.lexsort((self._durations, starts_us))
+            starts_us = starts_us[order]
+            durations_us = durations_us[order]
+        
+        # Cycle time and red gap between consecutive green lights, in microseconds
+        cycle_times = np.diff(starts_us)
+        red_durations = cycle_times - durations_us[:-1]
+        
+        # Only consider positive red durations (ignore overlapping or same-day multiples)
+        # Also filter out very large gaps (> 2 hours) as they're likely different days
+        candidates = np.flatnonzero((red_durations > 0) & (red_durations < MAX_RED_MS * 1000))
+        if candidates.size == 0:
             return None, None
         
         # Find the smallest red gap - this is our base pattern
-        smallest_gap = min(red_gaps, key=lambda x: x['red_duration'])
+        smallest = candidates[np.argmin(red_durations[candidates])]
         
-        return int(smallest_gap['cycle_time']), int(smallest_gap['red_duration'])
+        # Truncated to whole milliseconds
+        return int(cycle_times[smallest] // 1000), int(red_durations[smallest] // 1000)
+    
+    def _start_offsets_us(self) -> np.ndarray:
+        """Green light starts as integer microseconds after the earliest one, in input order."""
+        if self._start_offsets is None:
+            origin = min(self.timestamps)
+            self._start_offsets = np.fromiter(
+                ((ts - origin) // _ONE_MICROSECOND for ts in self.timestamps),
+                dtype=np.int64,
+                count=self.total_captures
+            )
+        return self._start_offsets
     
-    def _determine_regularity(self) -> Optional[str]:
+    @staticmethod
+    def _determine_regularity(std_dev: Optional[float], mean_duration: float) -> Optional[str]:
         """
         Determine schedule regularity based on variance in durations.
         
+        Args:
+            std_dev: Sample standard deviation of durations, None if insufficient data
+            mean_duration: Mean green light duration
+            
         Returns:
             "regular", "somewhat_regular", "irregular", or None if insufficient data
         """
-        if self.total_captures < 3:
+        if std_dev is None or not mean_duration:
             return None
         
-        # Check variance in green light durations
-        std_dev = stdev(self.durations)
-        avg_duration = mean(self.durations)
-        variance = std_dev / avg_duration
+        # Check variance in green light durations: below 10% is regular,
+        # below 20% somewhat regular, anything above irregular
+        variance = std_dev / mean_duration
         
-        if variance < 0.1:  # Less than 10% variation
-            return "regular"
-        elif variance < 0.2:  # Less than 20% variation
-            return "somewhat_regular"
-        else:
-            return "irregular"
+        return REGULARITY_LABELS[(variance >= 0.1) + (variance >= 0.2)]
     
-    def _predict_next_green_phase(self, base_cycle_ms: Optional[int], 
-                                   avg_duration: int) -> Tuple[Optional[str], Optional[str]]:
+    @staticmethod
+    def _predict_next_green_phase(last_green_start: datetime, base_cycle_ms: Optional[int],
+                                  avg_duration: int) -> Tuple[Optional[str], Optional[str]]:
         """
         Predict the next green phase based on the base cycle.
         
         Args:
+            last_green_start: Start of the most recent green light
             base_cycle_ms: The base cycle time in milliseconds
             avg_duration: Average green light duration
             
         Returns:
             Tuple of (next_green_start_iso, next_green_end_iso)
         """
-        if not self.timestamps or not base_cycle_ms:
+        if not base_cycle_ms:
             return None, None
         
-        # Use the most recent measurement as reference
-        last_green_start = max(self.timestamps)
-        
         # Handle timezone-aware timestamps
         if last_green_start.tzinfo is not None:
             now = datetime.now(last_green_start.tzinfo)
         else:
             now = datetime.now()
         
-        # Project forward using the base cycle
+        # Project forward using the base cycle, jumping straight to the first
+        # cycle after now instead of stepping through every elapsed one
+        cycle = timedelta(milliseconds=base_cycle_ms)
         next_start_dt = last_green_start
-        while next_start_dt <= now:
-            next_start_dt = next_start_dt + timedelta(milliseconds=base_cycle_ms)
+        if next_start_dt <= now:
+            next_start_dt += ((now - next_start_dt) // cycle + 1) * cycle
         
         next_end_dt = next_start_dt + timedelta(milliseconds=avg_duration)
         
@@ -192,23 +264,40 @@ class PatternDetector:
         if not self.timestamps or len(self.timestamps) < 2:
             return []
         
-        if reference_date is None:
-            reference_date = datetime.now().date()
-        
         # Get the base cycle
         base_cycle_ms, red_duration_ms = self._find_base_cycle()
         if not base_cycle_ms:
             return []
         
-        avg_duration = int(mean(self.durations))
+        # For simplicity, use the first measurement as reference
+        return self.build_timeline(
+            self.timestamps[0], base_cycle_ms, int(self._durations.mean()), reference_date, hours
+        )
+    
+    @staticmethod
+    def build_timeline(reference_measurement: datetime, base_cycle_ms: int, avg_duration: int,
+                       reference_date: Optional[datetime] = None, hours: Optional[int] = None) -> List[Dict]:
+        """
+        Project a base cycle over a time period, starting from a reference measurement.
+        
+        Used by get_daily_timeline() and by callers that find the base cycle
+        elsewhere (e.g. in SQL) instead of loading every measurement.
+        
+        Args:
+            reference_measurement: Green light start the projection is aligned to by time of day
+            base_cycle_ms: The base cycle time in milliseconds
+            avg_duration: Average green light duration in milliseconds
+            reference_date: The date to generate the timeline for (defaults to today)
+            hours: Number of hours to generate timeline for (defaults to 24 for full day)
+            
+        Returns:
+            List of dicts with 'start_time', 'end_time', 'state' (green/red)
+        """
+        if reference_date is None:
+            reference_date = datetime.now().date()
         
-        # Find a measurement to use as reference (prefer one from same day of week if possible)
-        # For simplicity, use the first measurement and align it by time of day
-        reference_measurement = self.timestamps[0]
         reference_time = reference_measurement.time()
         
-        # Start generating timeline from midnight
-        timeline = []
         current_time = datetime.combine(reference_date, time(0, 0, 0))
         
         # If hours is specified, limit the end time to current time + hours
@@ -224,38 +313,37 @@ class PatternDetector:
         # Find the first green light of the day by projecting backwards/forwards from reference
         first_green = datetime.combine(reference_date, reference_time)
         
-        # Project backwards to find when the pattern starts (could be before reference time)
-        while first_green > current_time:
-            first_green = first_green - timedelta(milliseconds=base_cycle_ms)
+        # Jump to the last cycle start at or before the period start (could be
+        # before the reference time, or cycles after it when starting from now)
+        cycle = timedelta(milliseconds=base_cycle_ms)
+        first_green += ((current_time - first_green) // cycle) * cycle
+        
+        # Now project forward through the specified time period: every cycle start
+        # in [current_time, end_time), as microsecond offsets from first_green
+        cycle_us = base_cycle_ms * 1000
+        period_start_us = (current_time - first_green) // _ONE_MICROSECOND
+        period_end_us = (end_time - first_green) // _ONE_MICROSECOND
+        green_starts = np.arange(
+            -(-period_start_us // cycle_us) * cycle_us, period_end_us, cycle_us, dtype=np.int64
+        )
+        green_ends = green_starts + avg_duration * 1000
+        red_ends = green_starts + cycle_us
         
-        # Now project forward through the specified time period
-        current_green_start = first_green
-        while current_green_start < end_time:
-            green_end = current_green_start + timedelta(milliseconds=avg_duration)
-            red_end = current_green_start + timedelta(milliseconds=base_cycle_ms)
-            
-            # Only add if within the specified time range
-            if current_green_start >= current_time and current_green_start < end_time:
-                # Add green phase
-                timeline.append({
-                    'start_time': current_green_start.isoformat(),
-                    'end_time': min(green_end, end_time).isoformat(),
-                    'state': 'green'
-                })
-                
-                # Add red phase
-                if green_end < end_time:
-                    timeline.append({
-                        'start_time': green_end.isoformat(),
-                        'end_time': min(red_end, end_time).isoformat(),
-                        'state': 'red'
-                    })
-            
-            current_green_start = red_end
+        # Each green phase, followed by its red phase unless the period ends first
+        timeline = []
+        for green_start, green_end, red_end, has_red in zip(
+            _isoformat(first_green, green_starts),
+            _isoformat(first_green, np.minimum(green_ends, period_end_us)),
+            _isoformat(first_green, np.minimum(red_ends, period_end_us)),
+            (green_ends < period_end_us).tolist()
+        ):
+            timeline.append({'start_time': green_start, 'end_time': green_end, 'state': 'green'})
+            if has_red:
+                timeline.append({'start_time': green_end, 'end_time': red_end, 'state': 'red'})
         
         return timeline
     
-    def validate_pattern(self, tolerance_ms: int = 5000) -> Dict:
+    def validate_pattern(self, tolerance_ms: int = VALIDATION_TOLERANCE_MS) -> Dict:
         """
         Validate the detected pattern against all measurements.
         
@@ -269,38 +357,44 @@ class PatternDetector:
         """
         base_cycle_ms, _ = self._find_base_cycle()
         if not base_cycle_ms or len(self.timestamps) < 2:
-            return {
-                'is_valid': False,
-                'matches': 0,
-                'total': len(self.timestamps),
-                'match_rate': 0.0
-            }
-        
-        # Use first measurement as anchor point
-        anchor = self.timestamps[0]
-        anchor_time = anchor.time()
+            return self.build_validation(0, len(self.timestamps))
+        
+        # Time of day of every measurement, in microseconds since midnight
+        origin = min(self.timestamps)
+        midnight = datetime.combine(origin.date(), time(0, 0, 0), origin.tzinfo)
+        origin_time_us = (origin - midnight) // _ONE_MICROSECOND
+        times_of_day = (origin_time_us + self._start_offsets_us()) % _DAY_US
+        
+        # Check if the time difference from the anchor (first measurement) on the
+        # same day is close to any multiple of the cycle
+        cycle_us = base_cycle_ms * 1000
+        tolerance_us = tolerance_ms * 1000
+        remainders = (times_of_day - times_of_day[0]) % cycle_us
+        
+        # Check both forward and backward alignment
+        matches = int(np.count_nonzero(
+            (remainders <= tolerance_us) | (remainders >= cycle_us - tolerance_us)
+        ))
+        
+        return self.build_validation(matches, len(self.timestamps))
+    
+    @staticmethod
+    def build_validation(matches: int, total: int) -> Dict:
+        """
+        Assemble validation results from the number of measurements aligned with the pattern.
         
-        matches = 0
-        for ts in self.timestamps:
-            # Check if this timestamp aligns with the pattern
-            # Calculate time difference from anchor on the same day
-            same_day_anchor = datetime.combine(ts.date(), anchor_time)
-            
-            # Find the nearest predicted green light
-            time_diff = (ts - same_day_anchor).total_seconds() * 1000
-            
-            # Check if it's close to any multiple of the cycle
-            remainder = time_diff % base_cycle_ms
+        Args:
+            matches: Measurements within tolerance of a projected green light
+            total: Number of measurements
             
-            # Check both forward and backward alignment
-            if remainder <= tolerance_ms or remainder >= (base_cycle_ms - tolerance_ms):
-                matches += 1
-        
-        match_rate = matches / len(self.timestamps) if self.timestamps else 0.0
+        Returns:
+            Dictionary with validation results
+        """
+        match_rate = matches / total if total else 0.0
         
         return {
             'is_valid': match_rate >= 0.7,  # At least 70% match
             'matches': matches,
-            'total': len(self.timestamps),
+            'total': total,
             'match_rate': match_rate
         }
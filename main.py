@@ -1,17 +1,35 @@
 """Traffic Light Assistant API - Main entry point."""
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from typing import Annotated
 
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import traffic_lights, schedules
-from app.auth import get_current_user
+from app.auth import get_current_user, close_http_client, prefetch_jwks, refresh_jwks_periodically
+from app.database import close_database
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up and tear down shared resources"""
+    await prefetch_jwks()
+    jwks_refresh = asyncio.create_task(refresh_jwks_periodically())
+    yield
+    jwks_refresh.cancel()
+    with suppress(asyncio.CancelledError):
+        await jwks_refresh
+    await close_http_client()
+    close_database()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Traffic Light Assistant API",
     description="API for managing traffic lights and capturing schedule patterns",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware for frontend communication
@@ -0,0 +1,42 @@
+"""Shared fixtures for the API tests."""
+
+import os
+import tempfile
+
+import pytest
+
+# Settings are read from the environment when the app modules are imported
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "traffic_lights.duckdb"))
+os.environ.setdefault("OIDC_PROVIDER_URL", "https://auth.example.com")
+os.environ.setdefault("OIDC_AUDIENCE", "traffic-light-assistant")
+
+from fastapi.testclient import TestClient
+
+import main
+from app import database
+from app.auth import get_current_user
+from app.routes import schedules, traffic_lights
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """API client on a fresh in-memory database, authenticated as a test user."""
+    database.close_database()
+    monkeypatch.setattr(database, "DB_PATH", ":memory:")
+    traffic_lights._response_cache.clear()
+    schedules._aggregate_cache.clear()
+    main.app.dependency_overrides[get_current_user] = lambda: {"sub": "test-user"}
+
+    # Not entered as a context manager, so the lifespan (JWKS prefetch) does not run
+    yield TestClient(main.app)
+
+    main.app.dependency_overrides.clear()
+    database.close_database()
+
+
+@pytest.fixture
+def traffic_light_id(client):
+    """ID of a newly created traffic light."""
+    response = client.post("/api/traffic-lights", json={"location": "Main St / 1st Ave"})
+    assert response.status_code == 200
+    return response.json()["id"]
@@ -0,0 +1,224 @@
+"""Tests for the OpenID Connect authentication."""
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from app import auth, cache as cache_module
+
+PROVIDER_URL = "https://auth.example.com"
+AUDIENCE = "traffic-light-assistant"
+
+
+def _generate_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+# Generating RSA keys is slow, so the tests share a few
+SIGNING_KEY = _generate_key()
+OTHER_KEY = _generate_key()
+
+
+def _jwk(private_key: rsa.RSAPrivateKey, kid: str) -> dict:
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, use="sig", alg="RS256")
+    return jwk
+
+
+def _token(kid: str | None = "key-1", private_key: rsa.RSAPrivateKey = SIGNING_KEY, **claims) -> str:
+    payload = {"sub": "user-1", "aud": AUDIENCE, "iss": PROVIDER_URL, "exp": int(time.time()) + 300}
+    payload.update(claims)
+    payload = {name: value for name, value in payload.items() if value is not None}
+    headers = {"kid": kid} if kid is not None else None
+    return jwt.encode(payload, private_key, algorithm="RS256", headers=headers)
+
+
+def _authenticate(token: str) -> dict:
+    return asyncio.run(auth.get_current_user(f"Bearer {token}"))
+
+
+def _assert_unauthorized(token: str) -> None:
+    with pytest.raises(HTTPException) as exc_info:
+        _authenticate(token)
+    assert exc_info.value.status_code == 401
+
+
+def _cached(token: str):
+    return auth.get_token_cache().get(hashlib.sha256(token.encode()).digest())
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Mocked OIDC provider; change its "keys" to rotate, "requests" counts JWKS fetches."""
+    state = {"keys": [_jwk(SIGNING_KEY, "key-1")], "requests": 0}
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/.well-known/openid-configuration":
+            return httpx.Response(200, json={"jwks_uri": f"{PROVIDER_URL}/jwks"})
+        state["requests"] += 1
+        return httpx.Response(200, json={"keys": state["keys"]})
+
+    monkeypatch.setattr(auth, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(auth, "_jwks_cache", None)
+    monkeypatch.setattr(auth, "_jwk_by_kid", {})
+    monkeypatch.setattr(auth, "_jwks_refreshed_at", float("-inf"))
+    monkeypatch.setattr(auth, "_token_cache", None)
+    return state
+
+
+class TestTokenValidation:
+    """Signature and claim checks."""
+
+    def test_valid_token(self, provider):
+        """Test that a correctly signed token yields its claims."""
+        assert _authenticate(_token())["sub"] == "user-1"
+
+    def test_missing_or_malformed_authorization(self, provider):
+        """Test rejection of missing headers, other schemes and undecodable tokens."""
+        for authorization in (None, "Basic dXNlcjpwYXNz", "Bearer "):
+            with pytest.raises(HTTPException) as exc_info:
+                asyncio.run(auth.get_current_user(authorization))
+            assert exc_info.value.status_code == 401
+
+        _assert_unauthorized("not-a-token")
+        not_an_object = base64.urlsafe_b64encode(b"[]").decode().rstrip("=")
+        _assert_unauthorized(f"{not_an_object}.e30.c2ln")
+
+    def test_wrong_audience(self, provider):
+        """Test rejection of a token issued for another client."""
+        _assert_unauthorized(_token(aud="someone-else"))
+
+    def test_wrong_issuer(self, provider):
+        """Test rejection of a token from another issuer."""
+        _assert_unauthorized(_token(iss="https://evil.example.com"))
+
+    def test_expired_token(self, provider):
+        """Test rejection of an expired token."""
+        _assert_unauthorized(_token(exp=int(time.time()) - 60))
+
+    def test_token_without_expiry(self, provider):
+        """Test rejection of a token that never expires."""
+        _assert_unauthorized(_token(exp=None))
+
+    def test_wrong_signature(self, provider):
+        """Test rejection of a token signed by another key under a known kid."""
+        _assert_unauthorized(_token(private_key=OTHER_KEY))
+
+    def test_unknown_kid(self, provider):
+        """Test rejection of a token whose kid is not in the JWKS."""
+        _assert_unauthorized(_token(kid="key-unknown", private_key=OTHER_KEY))
+
+    def test_no_kid_with_single_key(self, provider):
+        """Test that a token without kid is verified against the only key."""
+        assert _authenticate(_token(kid=None))["sub"] == "user-1"
+
+    def test_no_kid_with_several_keys(self, provider):
+        """Test rejection of a token without kid when the key is ambiguous."""
+        provider["keys"].append(_jwk(OTHER_KEY, "key-2"))
+
+        _assert_unauthorized(_token(kid=None))
+
+
+class TestTokenCache:
+    """Verified claims cache."""
+
+    def test_cache_hit_skips_verification(self, provider, monkeypatch):
+        """Test that a recently verified token is not decoded again."""
+        token = _token()
+        claims = _authenticate(token)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("jwt.decode called for a cached token")
+
+        monkeypatch.setattr(auth.jwt, "decode", fail)
+        assert _authenticate(token) == claims
+
+    def test_cache_ttl_capped_at_expiry(self, provider, monkeypatch):
+        """Test that claims are not cached past the token's own expiry."""
+        short_lived = _token(exp=int(time.time()) + 5)
+        long_lived = _token()
+        _authenticate(short_lived)
+        _authenticate(long_lived)
+
+        later = time.monotonic() + 10
+        monkeypatch.setattr(cache_module, "monotonic", lambda: later)
+
+        assert _cached(short_lived) is None
+        assert _cached(long_lived) is not None
+
+    def test_cache_cleared_only_when_jwks_changes(self, provider):
+        """Test that refreshing an unchanged JWKS keeps verified claims."""
+        token = _token()
+        _authenticate(token)
+
+        asyncio.run(auth.refresh_jwks())
+        assert _cached(token) is not None
+
+        provider["keys"].append(_jwk(OTHER_KEY, "key-2"))
+        asyncio.run(auth.refresh_jwks())
+        assert _cached(token) is None
+
+
+class TestJWKSRefresh:
+    """Picking up rotated provider keys."""
+
+    def test_rotated_key_fetched_on_demand(self, provider, monkeypatch):
+        """Test that a token signed with a newly published key is accepted without waiting."""
+        _authenticate(_token())
+        provider["keys"].append(_jwk(OTHER_KEY, "key-2"))
+        monkeypatch.setattr(auth, "_jwks_refreshed_at", float("-inf"))
+
+        assert _authenticate(_token(kid="key-2", private_key=OTHER_KEY))["sub"] == "user-1"
+        assert provider["requests"] == 2
+
+    def test_unknown_kid_refresh_rate_limited(self, provider, monkeypatch):
+        """Test that unknown kids trigger at most one JWKS fetch per interval."""
+        _authenticate(_token())
+        unknown = _token(kid="key-unknown", private_key=OTHER_KEY)
+
+        _assert_unauthorized(unknown)
+        assert provider["requests"] == 1
+
+        monkeypatch.setattr(auth, "_jwks_refreshed_at", float("-inf"))
+        _assert_unauthorized(unknown)
+        _assert_unauthorized(unknown)
+        assert provider["requests"] == 2
+
+    def test_periodic_refresh_stops_on_invalid_settings(self, monkeypatch):
+        """Test that invalid settings end the background refresh instead of raising."""
+        def invalid_settings():
+            raise ValueError("OIDC_PROVIDER_URL missing")
+
+        monkeypatch.setattr(auth, "get_settings", invalid_settings)
+
+        assert asyncio.run(asyncio.wait_for(auth.refresh_jwks_periodically(), timeout=1)) is None
+
+    def test_shutdown_waits_for_refresh_task(self, provider, monkeypatch):
+        """Test that the background refresh has stopped before shared clients are closed."""
+        events = []
+
+        async def refresh_forever():
+            try:
+                await asyncio.sleep(3600)
+            finally:
+                events.append("refresh stopped")
+
+        async def close_http_client():
+            events.append("http client closed")
+
+        monkeypatch.setattr(main, "refresh_jwks_periodically", refresh_forever)
+        monkeypatch.setattr(main, "close_http_client", close_http_client)
+        with TestClient(main.app):
+            pass
+
+        assert events == ["refresh stopped", "http client closed"]
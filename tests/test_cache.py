@@ -0,0 +1,120 @@
+"""Tests for the in-process TTL cache."""
+
+import pytest
+from app import cache as cache_module
+from app.cache import Generations, TTLCache
+
+
+class FakeClock:
+    """Controllable replacement for the monotonic clock used by app.cache."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module, "monotonic", fake)
+    return fake
+
+
+class TestTTLCache:
+    """Test suite for TTLCache class."""
+
+    def test_get_missing_returns_default(self):
+        """Test lookup of a key that was never stored."""
+        cache = TTLCache(maxsize=2, ttl=10)
+
+        assert cache.get("missing") is None
+        assert cache.get("missing", "fallback") == "fallback"
+
+    def test_entry_expires_after_ttl(self, clock):
+        """Test that entries are dropped once their lifetime has passed."""
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+
+        clock.now += 9
+        assert cache.get("a") == 1
+
+        clock.now += 1
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_per_entry_ttl_is_capped(self, clock):
+        """Test that a per-entry ttl can shorten but not extend the default."""
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("short", 1, ttl=2)
+        cache.set("long", 2, ttl=100)
+
+        clock.now += 5
+        assert cache.get("short") is None
+        assert cache.get("long") == 2
+
+        clock.now += 5
+        assert cache.get("long") is None
+
+    def test_non_positive_ttl_is_not_stored(self):
+        """Test that already-expired entries are never cached."""
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1, ttl=0)
+
+        assert cache.get("a") is None
+
+    def test_evicts_least_recently_used(self):
+        """Test LRU eviction once the cache is full."""
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_pop_and_clear(self):
+        """Test explicit invalidation."""
+        cache = TTLCache(maxsize=4, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.pop("a")
+        assert cache.get("a") is None
+
+        cache.clear()
+        assert len(cache) == 0
+
+
+class TestGenerations:
+    """Test suite for Generations class."""
+
+    def test_unchanged_without_writes(self):
+        """Test that the token is stable while nothing is written."""
+        generations = Generations()
+
+        assert generations.get("a") == generations.get("a")
+
+    def test_bump_changes_only_that_key(self):
+        """Test that a write changes the token of its own key only."""
+        generations = Generations()
+        before_a, before_b = generations.get("a"), generations.get("b")
+
+        generations.bump("a")
+
+        assert generations.get("a") != before_a
+        assert generations.get("b") == before_b
+
+    def test_bump_all_changes_every_key(self):
+        """Test that a write to everything changes every token, including bumped keys."""
+        generations = Generations()
+        generations.bump("a")
+        before_a, before_b = generations.get("a"), generations.get("b")
+
+        generations.bump_all()
+
+        assert generations.get("a") != before_a
+        assert generations.get("b") != before_b
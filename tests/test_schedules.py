@@ -0,0 +1,246 @@
+"""Tests for the schedule endpoints."""
+
+import pytest
+from datetime import date, datetime, timedelta
+
+from app.routes import schedules
+from app.services import pattern_detector
+from app.services.pattern_detector import PatternDetector
+
+BASE_TIME = datetime(2025, 12, 1, 8, 30, 0)
+FROZEN_NOW = datetime(2025, 12, 1, 9, 12, 34, 567000)
+
+
+def _every(step: timedelta, count: int, start: datetime = BASE_TIME) -> list:
+    return [start + step * i for i in range(count)]
+
+
+# Measurement series from the PatternDetector tests, as (green starts, durations in ms)
+SERIES = {
+    "empty": ([], []),
+    "single": ([BASE_TIME], [30000]),
+    "consecutive": (_every(timedelta(minutes=5), 4), [30000, 31000, 29000, 30500]),
+    "daily_repeating": (_every(timedelta(days=1), 3), [30000, 31000, 30500]),
+    "multiple_daily": (_every(timedelta(minutes=5), 5), [30000, 25000, 31000, 24000, 29500]),
+    "sparse": (
+        [datetime(2025, 12, 1, 8, 30), datetime(2025, 12, 3, 14, 15),
+         datetime(2025, 12, 5, 17, 45), datetime(2025, 12, 7, 9, 0)],
+        [30000, 28000, 32000, 29000]
+    ),
+    "irregular": (_every(timedelta(minutes=5), 4), [20000, 50000, 25000, 60000]),
+    "somewhat_regular": (_every(timedelta(minutes=5), 4), [30000, 38000, 32000, 40000]),
+    "simple": (_every(timedelta(minutes=2), 4, datetime(2025, 12, 1, 8, 0)), [30000] * 4),
+    "very_long_cycle": (_every(timedelta(days=14), 2), [30000, 30000]),
+    "same_time_same_day": (_every(timedelta(seconds=30), 3), [30000] * 3),
+    "variance_threshold": (_every(timedelta(minutes=5), 5), [30000, 31500, 28500, 32400, 27600]),
+    "overlapping": (_every(timedelta(seconds=10), 2, datetime(2025, 12, 1, 8, 0)), [30000, 30000]),
+    # Sub-second cycle where converting through float seconds loses a millisecond
+    "fractional": (_every(timedelta(seconds=32.05), 4), [12345] * 4),
+}
+
+
+class _FrozenDatetime(datetime):
+    """datetime whose now() is fixed, so predictions can be compared."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return FROZEN_NOW.replace(tzinfo=tz)
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(pattern_detector, "datetime", _FrozenDatetime)
+
+
+def _capture(client, traffic_light_id, timestamps, durations) -> PatternDetector:
+    """Store the measurements and return a detector over them as stored, in green start order."""
+    for green_start, duration in zip(timestamps, durations):
+        response = client.post(f"/api/traffic-lights/{traffic_light_id}/schedules", json={
+            "traffic_light_id": traffic_light_id,
+            "green_start": green_start.isoformat(),
+            "green_end": (green_start + timedelta(milliseconds=duration)).isoformat()
+        })
+        assert response.status_code == 200
+
+    stored = client.get(f"/api/traffic-lights/{traffic_light_id}/schedules").json()
+    stored.sort(key=lambda schedule: (schedule["green_start"], schedule["duration_ms"]))
+    return PatternDetector(
+        [datetime.fromisoformat(schedule["green_start"]) for schedule in stored],
+        [schedule["duration_ms"] for schedule in stored]
+    )
+
+
+class TestSchedulePattern:
+    """The SQL-aggregated pattern endpoints agree with PatternDetector."""
+
+    @pytest.mark.parametrize("name", SERIES)
+    def test_pattern_matches_detector(self, client, traffic_light_id, frozen_now, name):
+        """Test the pattern endpoint against PatternDetector.analyze()."""
+        detector = _capture(client, traffic_light_id, *SERIES[name])
+
+        response = client.get(f"/api/traffic-lights/{traffic_light_id}/pattern")
+
+        assert response.status_code == 200
+        pattern = response.json()
+        expected = detector.analyze()
+        # DuckDB and NumPy may round the standard deviation differently
+        assert pattern.pop("stddev_duration_ms") == pytest.approx(expected.pop("stddev_duration_ms", None))
+        assert {key: pattern[key] for key in expected} == expected
+
+    @pytest.mark.parametrize("hours", [None, 2])
+    @pytest.mark.parametrize("name", SERIES)
+    def test_timeline_matches_detector(self, client, traffic_light_id, frozen_now, name, hours):
+        """Test the timeline endpoint against get_daily_timeline() and validate_pattern()."""
+        detector = _capture(client, traffic_light_id, *SERIES[name])
+        params = {"date": "2025-12-01"}
+        if hours is not None:
+            params["hours"] = hours
+
+        response = client.get(f"/api/traffic-lights/{traffic_light_id}/pattern/timeline", params=params)
+
+        assert response.status_code == 200
+        timeline = response.json()
+        entries = detector.get_daily_timeline(reference_date=date(2025, 12, 1), hours=hours)
+        assert timeline["entries"] == entries
+        assert timeline["has_pattern"] is (len(entries) > 0)
+        if detector.total_captures >= 2:
+            assert timeline["validation"] == detector.validate_pattern()
+
+    def test_pattern_unknown_traffic_light(self, client):
+        """Test the pattern endpoints for a traffic light that does not exist."""
+        assert client.get("/api/traffic-lights/missing/pattern").status_code == 404
+        assert client.get("/api/traffic-lights/missing/pattern/timeline").status_code == 404
+
+
+class TestAggregateCache:
+    """Cached pattern aggregates follow schedule writes."""
+
+    def _schedule(self, traffic_light_id, green_start):
+        return {
+            "traffic_light_id": traffic_light_id,
+            "green_start": green_start.isoformat(),
+            "green_end": (green_start + timedelta(seconds=30)).isoformat()
+        }
+
+    def _captures(self, client, traffic_light_id):
+        pattern = client.get(f"/api/traffic-lights/{traffic_light_id}/pattern").json()
+        timeline = client.get(
+            f"/api/traffic-lights/{traffic_light_id}/pattern/timeline", params={"date": "2025-12-01"}
+        ).json()
+        return pattern["total_captures"], timeline["has_pattern"]
+
+    def test_writes_invalidate(self, client, traffic_light_id):
+        """Test that creating, batch-creating and deleting schedules is reflected immediately."""
+        assert self._captures(client, traffic_light_id) == (0, False)
+
+        first = client.post(
+            f"/api/traffic-lights/{traffic_light_id}/schedules",
+            json=self._schedule(traffic_light_id, BASE_TIME)
+        ).json()
+        assert self._captures(client, traffic_light_id) == (1, False)
+
+        client.post(
+            f"/api/traffic-lights/{traffic_light_id}/schedules/batch",
+            json=[self._schedule(traffic_light_id, BASE_TIME + timedelta(minutes=2))]
+        )
+        assert self._captures(client, traffic_light_id) == (2, True)
+
+        client.delete(f"/api/schedules/{first['id']}")
+        assert self._captures(client, traffic_light_id) == (1, False)
+
+    def test_write_during_query_is_not_hidden(self, client, traffic_light_id, monkeypatch):
+        """Test that an aggregate read before a concurrent write is not cached."""
+        fetch_one = schedules.fetch_one
+
+        async def fetch_one_then_write(conn, query, parameters=None):
+            row = await fetch_one(conn, query, parameters)
+            if "WITH" in query:
+                # A schedule is created while the aggregate query is in flight
+                conn.execute(
+                    "INSERT INTO schedules (id, traffic_light_id, green_start, green_end, duration_ms) "
+                    "VALUES ('concurrent', ?, TIMESTAMP '2025-12-01 08:30:00', "
+                    "TIMESTAMP '2025-12-01 08:30:30', 30000)",
+                    [traffic_light_id]
+                )
+                schedules._invalidate_aggregates(traffic_light_id)
+                monkeypatch.setattr(schedules, "fetch_one", fetch_one)
+            return row
+
+        monkeypatch.setattr(schedules, "fetch_one", fetch_one_then_write)
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}/pattern").json()["total_captures"] == 0
+
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}/pattern").json()["total_captures"] == 1
+
+
+class TestCreateSchedulesBatch:
+    """Creating several schedules in one request."""
+
+    def test_batch_created(self, client, traffic_light_id):
+        """Test that every schedule is stored and returned with its duration."""
+        response = client.post(f"/api/traffic-lights/{traffic_light_id}/schedules/batch", json=[
+            {"traffic_light_id": traffic_light_id,
+             "green_start": "2025-12-01T08:00:00", "green_end": "2025-12-01T08:00:30.500"},
+            {"traffic_light_id": traffic_light_id,
+             "green_start": "2025-12-01T08:02:00", "green_end": "2025-12-01T08:02:29"},
+        ])
+
+        assert response.status_code == 200
+        created = sorted(response.json(), key=lambda schedule: schedule["green_start"])
+        assert [(schedule["traffic_light_id"], schedule["green_start"], schedule["green_end"],
+                 schedule["duration_ms"]) for schedule in created] == [
+            (traffic_light_id, "2025-12-01 08:00:00", "2025-12-01 08:00:30.5", 30500),
+            (traffic_light_id, "2025-12-01 08:02:00", "2025-12-01 08:02:29", 29000),
+        ]
+        assert len({schedule["id"] for schedule in created}) == 2
+
+        stored = client.get(f"/api/traffic-lights/{traffic_light_id}/schedules").json()
+        assert sorted(stored, key=lambda schedule: schedule["green_start"]) == created
+
+    def test_unknown_traffic_light(self, client):
+        """Test that nothing is stored for a traffic light that does not exist."""
+        response = client.post("/api/traffic-lights/missing/schedules/batch", json=[
+            {"traffic_light_id": "missing",
+             "green_start": "2025-12-01T08:00:00", "green_end": "2025-12-01T08:00:30"},
+        ])
+
+        assert response.status_code == 404
+
+    def test_empty_batch(self, client, traffic_light_id):
+        """Test that an empty batch is accepted and stores nothing."""
+        response = client.post(f"/api/traffic-lights/{traffic_light_id}/schedules/batch", json=[])
+
+        assert response.status_code == 200
+        assert response.json() == []
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}/schedules").json() == []
+
+    def test_empty_batch_unknown_traffic_light(self, client):
+        """Test that an empty batch for a traffic light that does not exist is rejected."""
+        response = client.post("/api/traffic-lights/missing/schedules/batch", json=[])
+
+        assert response.status_code == 404
+
+    def test_batch_too_large(self, client, traffic_light_id):
+        """Test that a batch above the size limit is rejected and stores nothing."""
+        schedule = {"traffic_light_id": traffic_light_id,
+                    "green_start": "2025-12-01T08:00:00", "green_end": "2025-12-01T08:00:30"}
+
+        response = client.post(
+            f"/api/traffic-lights/{traffic_light_id}/schedules/batch",
+            json=[schedule] * (schedules.MAX_BATCH_SIZE + 1)
+        )
+
+        assert response.status_code == 422
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}/schedules").json() == []
+
+    def test_offset_timestamps_stored_as_utc(self, client, traffic_light_id):
+        """Test that timestamps with a UTC offset are normalised to naive UTC."""
+        response = client.post(f"/api/traffic-lights/{traffic_light_id}/schedules/batch", json=[
+            {"traffic_light_id": traffic_light_id,
+             "green_start": "2025-12-01T10:00:00+02:00", "green_end": "2025-12-01T08:00:30Z"},
+        ])
+
+        assert response.status_code == 200
+        [schedule] = response.json()
+        assert schedule["green_start"] == "2025-12-01 08:00:00"
+        assert schedule["green_end"] == "2025-12-01 08:00:30"
+        assert schedule["duration_ms"] == 30000
@@ -0,0 +1,138 @@
+"""Tests for the traffic light endpoints."""
+
+import pytest
+
+from app.routes import traffic_lights
+
+
+class TestTrafficLightCache:
+    """Cached traffic light responses follow writes."""
+
+    def test_update_invalidates(self, client, traffic_light_id):
+        """Test that an update is visible after the light was cached."""
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").json()["notes"] is None
+
+        client.put(f"/api/traffic-lights/{traffic_light_id}", json={"notes": "changed"})
+
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").json()["notes"] == "changed"
+
+    def test_delete_invalidates(self, client, traffic_light_id):
+        """Test that a deleted light is not served from the cache."""
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").status_code == 200
+
+        client.delete(f"/api/traffic-lights/{traffic_light_id}")
+
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").status_code == 404
+
+    def test_delete_all_invalidates(self, client, traffic_light_id):
+        """Test that no light is served from the cache after deleting all of them."""
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").status_code == 200
+
+        client.delete("/api/traffic-lights")
+
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").status_code == 404
+
+    def test_update_during_query_is_not_hidden(self, client, traffic_light_id, monkeypatch):
+        """Test that a light read before a concurrent update is not cached."""
+        fetch_all = traffic_lights.fetch_all
+
+        async def fetch_all_then_update(conn, query, parameters=None):
+            rows = await fetch_all(conn, query, parameters)
+            # The light is updated while it is being read
+            conn.execute("UPDATE traffic_lights SET notes = 'changed' WHERE id = ?", [traffic_light_id])
+            traffic_lights._invalidate_light(traffic_light_id)
+            monkeypatch.setattr(traffic_lights, "fetch_all", fetch_all)
+            return rows
+
+        monkeypatch.setattr(traffic_lights, "fetch_all", fetch_all_then_update)
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").json()["notes"] is None
+
+        assert client.get(f"/api/traffic-lights/{traffic_light_id}").json()["notes"] == "changed"
+
+
+class TestTrafficLightListETag:
+    """Conditional requests on the traffic light list."""
+
+    def _etag(self, client) -> str:
+        response = client.get("/api/traffic-lights")
+        assert response.status_code == 200
+        return response.headers["ETag"]
+
+    def test_matching_etag_not_modified(self, client, traffic_light_id):
+        """Test that a matching If-None-Match returns 304 with the ETag and no body."""
+        etag = self._etag(client)
+
+        response = client.get("/api/traffic-lights", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    def test_weak_list_and_wildcard_match(self, client, traffic_light_id):
+        """Test weak tags, tag lists and * in If-None-Match."""
+        etag = self._etag(client)
+
+        for if_none_match in (f"W/{etag}", f'"other", {etag}', "*"):
+            response = client.get("/api/traffic-lights", headers={"If-None-Match": if_none_match})
+            assert response.status_code == 304, if_none_match
+
+    def test_other_etag_returns_list(self, client, traffic_light_id):
+        """Test that a stale ETag gets the full list."""
+        response = client.get("/api/traffic-lights", headers={"If-None-Match": '"0-0"'})
+
+        assert response.status_code == 200
+        assert [light["id"] for light in response.json()] == [traffic_light_id]
+
+    def test_etag_changes_on_writes(self, client, traffic_light_id):
+        """Test that create, update, delete and delete-all each produce a new ETag."""
+        etags = [self._etag(client)]
+
+        other = client.post("/api/traffic-lights", json={"location": "Elm St"}).json()["id"]
+        etags.append(self._etag(client))
+
+        client.put(f"/api/traffic-lights/{traffic_light_id}", json={"notes": "changed"})
+        etags.append(self._etag(client))
+
+        client.delete(f"/api/traffic-lights/{other}")
+        etags.append(self._etag(client))
+
+        client.delete("/api/traffic-lights")
+        etags.append(self._etag(client))
+
+        assert len(set(etags)) == len(etags)
+        assert client.get("/api/traffic-lights", headers={"If-None-Match": etags[0]}).status_code == 200
+
+
+class TestTrafficLightListPaging:
+    """limit and offset on the traffic light list."""
+
+    @pytest.fixture
+    def newest_first(self, client):
+        """IDs of five traffic lights, newest first."""
+        ids = [
+            client.post("/api/traffic-lights", json={"location": f"Light {number}"}).json()["id"]
+            for number in range(5)
+        ]
+        return ids[::-1]
+
+    def _ids(self, client, **params):
+        response = client.get("/api/traffic-lights", params=params)
+        assert response.status_code == 200
+        return [light["id"] for light in response.json()]
+
+    def test_all_without_limit(self, client, newest_first):
+        """Test that omitting limit returns every light, newest first."""
+        assert self._ids(client) == newest_first
+        assert self._ids(client, offset=3) == newest_first[3:]
+
+    def test_pages(self, client, newest_first):
+        """Test consecutive pages."""
+        assert self._ids(client, limit=2) == newest_first[:2]
+        assert self._ids(client, limit=2, offset=2) == newest_first[2:4]
+        assert self._ids(client, limit=2, offset=4) == newest_first[4:]
+        assert self._ids(client, limit=2, offset=5) == []
+
+    def test_invalid_parameters(self, client, newest_first):
+        """Test that a non-positive limit or a negative offset is rejected."""
+        assert client.get("/api/traffic-lights", params={"limit": 0}).status_code == 422
+        assert client.get("/api/traffic-lights", params={"offset": -1}).status_code == 422